@@ -1,13 +1,15 @@
 from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect, request
-from urllib.parse import unquote
+from flask import Response, redirect, request
+from sqlalchemy import Float, Integer, and_, bindparam, case, cast, delete, func, insert, literal, select, update
 from sqlalchemy.exc import IntegrityError
 from model import Session, Despesa, TipoDespesa
 from logger import logger
 from schemas import *
 from flask_cors import CORS
+from werkzeug.http import quote_etag
 from datetime import datetime
-import traceback
+from functools import lru_cache
+import orjson
 
 info = Info(
     title="API de Despesas Mensais",
@@ -17,6 +19,7 @@ API PARA GERENCIAMENTO DE DESPESAS MENSAIS
 
 Funcionalidades principais:
 - Criar despesas com diferentes tipos (CRÉDITO FIXO, CRÉDITO PARCELADO, PIX, BOLETO)
+- Criar várias despesas em uma única requisição (POST /despesas/bulk, JSON)
 - Listar todas as despesas cadastradas
 - Buscar despesa específica por ID
 - Atualizar despesas existentes
@@ -36,7 +39,7 @@ Códigos de Status HTTP:
 - 500: Internal Server Error - Erro interno do servidor
 
 Formato de Dados:
-- Entrada: FormData (multipart/form-data)
+- Entrada: FormData (multipart/form-data); JSON em POST /despesas/bulk
 - Saída: JSON
 - Valores monetários: Float com duas casas decimais
 - Datas: Formato brasileiro (dd/mm/yyyy HH:MM)
@@ -45,6 +48,64 @@ Formato de Dados:
 app = OpenAPI(__name__, info=info)
 CORS(app)
 
+# colunas lidas por apresenta_despesa, usadas quando a linha vem de um RETURNING/SELECT
+COLUNAS_DESPESA = (Despesa.id, Despesa.tipo, Despesa.titulo, Despesa.valor, Despesa.parcelas,
+                   Despesa.dia_vencimento, Despesa.paga, Despesa.data_insercao)
+# listagem montada uma única vez: apenas as colunas serializadas, sem construir
+# objetos do ORM, das mais recentes para as mais antigas (ix_despesa_data_insercao)
+LISTAGEM_DESPESAS = select(*COLUNAS_DESPESA) \
+    .order_by(Despesa.data_insercao.desc(), Despesa.id.desc()) \
+    .execution_options(yield_per=500)
+# o RETURNING do SQLite devolve REAL sem parte fracionária como inteiro
+COLUNAS_RETURNING = tuple(cast(c, Float).label("valor") if c is Despesa.valor else c
+                          for c in COLUNAS_DESPESA)
+
+# demais comandos fixos, também montados uma única vez e parametrizados por bindparam
+BUSCA_DESPESA = select(*COLUNAS_DESPESA).where(Despesa.id == bindparam("id"))
+REMOCAO_DESPESA = delete(Despesa).where(Despesa.id == bindparam("id"))
+INSERCAO_DESPESAS = insert(Despesa).returning(*COLUNAS_RETURNING, sort_by_parameter_order=True)
+# agregado barato que muda a cada inserção, atualização ou remoção (usado no ETag)
+VERSAO_DESPESAS = select(func.count(Despesa.id), func.max(Despesa.id), func.max(Despesa.data_atualizacao))
+
+def gera_etag(*partes):
+    """ Monta o valor de um ETag fraco a partir de identificadores e datas de
+        alteração, no formato "<parte>-<parte>-...".
+    """
+    return "-".join(parte.strftime("%Y%m%d%H%M%S%f") if isinstance(parte, datetime) else str(parte)
+                    for parte in partes)
+
+def jsonify_fast(payload, status=200, headers=None):
+    """ Serializa a resposta com orjson, mais rápido que o json padrão do Flask.
+    """
+    return Response(orjson.dumps(payload), status=status, headers=headers, mimetype="application/json")
+
+@lru_cache(maxsize=1)
+def listagem_serializada(versao):
+    """ Retorna o JSON da listagem de despesas para uma versão da tabela
+        (total, último id, última alteração). Enquanto a versão não muda, as
+        requisições reaproveitam os bytes já serializados.
+    """
+    despesas = Session().execute(LISTAGEM_DESPESAS)
+    return b'{"despesas":[' + b",".join(orjson.dumps(apresenta_despesa(d)) for d in despesas) + b"]}"
+
+@app.after_request
+def commit_session(response):
+    """Encerra a transação da requisição em um único ponto: confirma as
+    alterações quando a resposta é de sucesso e as desfaz em caso de erro.
+    """
+    if response.status_code < 400:
+        Session.commit()
+    else:
+        Session.rollback()
+    return response
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """Descarta a sessão da thread ao final de cada requisição, devolvendo a
+    conexão ao pool.
+    """
+    Session.remove()
+
 # definindo tags
 documentacao_tag = Tag(name="Documentação", description="Acesso à documentação interativa da API (Swagger, ReDoc, RapiDoc)")
 despesa_tag = Tag(name="Despesa", description="Operações CRUD para gerenciamento de despesas mensais: criar, listar, buscar, atualizar e remover")
@@ -84,11 +145,8 @@ def add_despesa(form: DespesaSchema):
     **Retorna:** Despesa criada com ID e data de inserção
     """
     try:
-        # Converter string para enum
-        tipo_enum = TipoDespesa(form.tipo)
-        
         despesa = Despesa(
-            tipo=tipo_enum,
+            tipo=form.tipo,
             titulo=form.titulo,
             valor=form.valor,
             dia_vencimento=form.dia_vencimento,
@@ -99,9 +157,9 @@ def add_despesa(form: DespesaSchema):
         
         session = Session()
         session.add(despesa)
-        session.commit()
+        session.flush()
         logger.debug(f"Adicionada despesa: '{despesa.titulo}'")
-        return apresenta_despesa(despesa), 200
+        return jsonify_fast(apresenta_despesa(despesa))
         
     except IntegrityError as e:
         error_msg = "Erro de integridade ao adicionar despesa"
@@ -110,8 +168,39 @@ def add_despesa(form: DespesaSchema):
         
     except Exception as e:
         error_msg = "Não foi possível salvar nova despesa"
-        logger.error(f"Erro ao adicionar despesa: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Erro ao adicionar despesa: %s", e)
+        return {"message": error_msg}, 400
+
+@app.post('/despesas/bulk', tags=[despesa_tag],
+          responses={"200": ListagemDespesasSchema, "409": ErrorSchema, "400": ErrorSchema})
+def add_despesas(body: DespesaBulkSchema):
+    """Adiciona várias despesas mensais de uma só vez.
+    
+    **Método HTTP:** POST
+    
+    **Corpo (JSON):**
+    - items: Lista de despesas, cada uma com os mesmos campos de POST /despesa
+    
+    **Retorna:** Despesas criadas, na ordem enviada, com ID e data de inserção
+    """
+    try:
+        rows = [item.dict() for item in body.items]
+        logger.debug(f"Adicionando %d despesas" % len(rows))
+        
+        session = Session()
+        # executemany com RETURNING: o SQLAlchemy agrupa as linhas em INSERTs de múltiplos VALUES
+        despesas = session.execute(INSERCAO_DESPESAS, rows).all()
+        logger.debug(f"Adicionadas %d despesas" % len(despesas))
+        return jsonify_fast(apresenta_despesas(despesas))
+        
+    except IntegrityError as e:
+        error_msg = "Erro de integridade ao adicionar despesas"
+        logger.warning(f"Erro ao adicionar despesas, {error_msg}: {str(e)}")
+        return {"message": error_msg}, 409
+        
+    except Exception as e:
+        error_msg = "Não foi possível salvar as novas despesas"
+        logger.exception("Erro ao adicionar despesas: %s", e)
         return {"message": error_msg}, 400
 
 @app.get('/despesas', tags=[despesa_tag],
@@ -123,20 +212,21 @@ def get_despesas():
     
     **Parâmetros:** Nenhum
     
-    **Retorna:** Lista de todas as despesas com seus detalhes completos
+    **Retorna:** Lista de todas as despesas com seus detalhes completos, das mais
+    recentes para as mais antigas
     """
     try:
         logger.debug(f"Coletando despesas")
         session = Session()
-        despesas = session.query(Despesa).all()
-        if not despesas:
-            return {"despesas": []}, 200
-        else:
-            logger.debug(f"%d despesas encontradas" % len(despesas))
-            return apresenta_despesas(despesas), 200
+        versao = tuple(session.execute(VERSAO_DESPESAS).one())
+        etag = gera_etag(*versao)
+        headers = {"ETag": quote_etag(etag, weak=True), "Cache-Control": "private, no-cache"}
+        if request.if_none_match.contains_weak(etag):
+            return "", 304, headers
+        logger.debug(f"%d despesas encontradas" % versao[0])
+        return Response(listagem_serializada(versao), mimetype="application/json", headers=headers)
     except Exception as e:
-        logger.error(f"Erro ao listar despesas: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Erro ao listar despesas: %s", e)
         return {"message": "Erro interno do servidor"}, 500
 
 @app.get('/despesa', tags=[despesa_tag],
@@ -155,17 +245,19 @@ def get_despesa(query: DespesaBuscaSchema):
         despesa_id = query.id
         logger.debug(f"Coletando dados sobre despesa #{despesa_id}")
         session = Session()
-        despesa = session.query(Despesa).filter(Despesa.id == despesa_id).first()
+        despesa = session.get(Despesa, despesa_id)
         if not despesa:
             error_msg = "Despesa não encontrada na base"
             logger.warning(f"Erro ao buscar despesa #{despesa_id}, {error_msg}")
             return {"message": error_msg}, 404
         else:
+            etag = gera_etag(despesa.id, despesa.data_atualizacao)
+            if request.if_none_match.contains_weak(etag):
+                return "", 304, {"ETag": quote_etag(etag, weak=True)}
             logger.debug(f"Despesa encontrada: '{despesa.titulo}'")
-            return apresenta_despesa(despesa), 200
+            return jsonify_fast(apresenta_despesa(despesa), headers={"ETag": quote_etag(etag, weak=True)})
     except Exception as e:
-        logger.error(f"Erro ao buscar despesa: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Erro ao buscar despesa: %s", e)
         return {"message": "Erro interno do servidor"}, 500
 
 @app.put('/despesa', tags=[despesa_tag],
@@ -195,42 +287,49 @@ def update_despesa(form: DespesaAtualizaSchema):
     try:
         despesa_id = form.id
         logger.debug(f"Atualizando despesa #{despesa_id}")
+        # Apenas os campos informados entram no UPDATE
+        valores = form.dict(exclude={"id"}, exclude_none=True)
+        if form.tipo is not None:
+            # Se o tipo não for CRÉDITO PARCELADO, zera parcelas
+            if form.tipo != 'CRÉDITO PARCELADO':
+                valores["parcelas"] = None
+        elif form.parcelas is not None:
+            # Sem novo tipo, parcelas só é alterada se o tipo gravado for CRÉDITO PARCELADO
+            valores["parcelas"] = case(
+                (Despesa.tipo == TipoDespesa.CREDITO_PARCELADO.value, form.parcelas),
+                else_=Despesa.parcelas
+            )
+        if form.paga is not None:
+            # Reduzindo número de parcelas quando despesa do tipo CRÉDITO PARCELADO é marcada como paga.
+            # A decisão é tomada pelo banco sobre os valores gravados, então o decremento é atômico.
+            tipo = literal(valores["tipo"], Despesa.tipo.type) if "tipo" in valores else Despesa.tipo
+            parcelas = valores.get("parcelas", Despesa.parcelas)
+            if parcelas is None or isinstance(parcelas, int):
+                parcelas = literal(parcelas, Integer)
+            valores["parcelas"] = case(
+                (and_(tipo == TipoDespesa.CREDITO_PARCELADO.value, parcelas > 0,
+                      Despesa.paga.is_not(True), literal(form.paga) == True), parcelas - 1),
+                else_=parcelas
+            )
+
         session = Session()
-        despesa = session.query(Despesa).filter(Despesa.id == despesa_id).first()
+        if valores:
+            # o SET depende dos campos informados, então este comando é montado aqui
+            stmt = update(Despesa).where(Despesa.id == despesa_id).values(**valores) \
+                .returning(*COLUNAS_RETURNING).execution_options(synchronize_session=False)
+            despesa = session.execute(stmt).one_or_none()
+        else:
+            despesa = session.execute(BUSCA_DESPESA, {"id": despesa_id}).one_or_none()
         if not despesa:
             error_msg = "Despesa não encontrada na base"
             logger.warning(f"Erro ao atualizar despesa #{despesa_id}, {error_msg}")
             return {"message": error_msg}, 404
-        
-        if form.tipo is not None:
-            despesa.tipo = TipoDespesa(form.tipo)
-            # Se o tipo não for CRÉDITO PARCELADO, zera parcelas
-            if form.tipo != 'CRÉDITO PARCELADO':
-                despesa.parcelas = None
-        if form.titulo is not None:
-            despesa.titulo = form.titulo
-        if form.valor is not None:
-            despesa.valor = form.valor
-        if form.dia_vencimento is not None:
-            despesa.dia_vencimento = form.dia_vencimento
-        if form.parcelas is not None and (form.tipo == 'CRÉDITO PARCELADO' or despesa.tipo.value == 'CRÉDITO PARCELADO'):
-            despesa.parcelas = form.parcelas
-        if form.paga is not None:
-            # Reduzindo número de parcelas quando despesa do tipo CRÉDITO PARCELADO é marcada como paga
-            if form.paga and not despesa.paga and despesa.tipo.value == 'CRÉDITO PARCELADO' and despesa.parcelas is not None and despesa.parcelas > 0:
-                despesa.parcelas = despesa.parcelas - 1
-                logger.debug(f"Parcela paga para despesa #{despesa_id}. Parcelas restantes: {despesa.parcelas}")
-            
-            despesa.paga = form.paga
-        
-        session.commit()
-        logger.debug(f"Despesa #{despesa_id} atualizada com sucesso")
-        return apresenta_despesa(despesa), 200
+        logger.debug(f"Despesa #{despesa_id} atualizada com sucesso. Parcelas restantes: {despesa.parcelas}")
+        return jsonify_fast(apresenta_despesa(despesa))
         
     except Exception as e:
         error_msg = "Não foi possível atualizar a despesa"
-        logger.error(f"Erro ao atualizar despesa: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Erro ao atualizar despesa: %s", e)
         return {"message": error_msg}, 400
 
 @app.delete('/despesa', tags=[despesa_tag],
@@ -249,16 +348,14 @@ def del_despesa(query: DespesaBuscaSchema):
         despesa_id = query.id
         logger.debug(f"Deletando dados sobre despesa #{despesa_id}")
         session = Session()
-        count = session.query(Despesa).filter(Despesa.id == despesa_id).delete()
-        session.commit()
+        count = session.execute(REMOCAO_DESPESA, {"id": despesa_id}).rowcount
         if count:
             logger.debug(f"Deletada despesa #{despesa_id}")
-            return {"message": "Despesa removida", "id": despesa_id}
+            return jsonify_fast({"message": "Despesa removida", "id": despesa_id})
         else:
             error_msg = "Despesa não encontrada na base"
             logger.warning(f"Erro ao deletar despesa #{despesa_id}, {error_msg}")
             return {"message": error_msg}, 404
     except Exception as e:
-        logger.error(f"Erro ao deletar despesa: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Erro ao deletar despesa: %s", e)
         return {"message": "Erro interno do servidor"}, 500
@@ -1,6 +1,7 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy_utils import database_exists, create_database
 
 from model.base import Base
@@ -12,9 +13,30 @@ if not os.path.exists(db_path):
 
 db_url = 'sqlite:///%s/db.sqlite3' % db_path
 
-engine = create_engine(db_url, echo=False)
+# pool de conexões reaproveitado entre as requisições
+engine_args = dict(echo=False, pool_size=20, max_overflow=40, pool_pre_ping=True, future=True,
+                   insertmanyvalues_page_size=1000)  # linhas por INSERT nas inserções em lote
+if make_url(db_url).get_driver_name() == "psycopg2":
+    # executemany agrupado (execute_values/execute_batch) caso a base passe a ser PostgreSQL
+    engine_args.update(executemany_mode="values_plus_batch", executemany_batch_page_size=500)
 
-Session = sessionmaker(bind=engine)
+engine = create_engine(db_url, **engine_args)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def configura_sqlite(dbapi_connection, connection_record):
+        """ WAL permite leituras simultâneas a uma escrita e, com synchronous=NORMAL,
+            o commit não exige fsync a cada transação.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+# uma sessão por thread, removida ao final de cada requisição (ver app.py)
+Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False, autoflush=False))
 
 if not database_exists(engine.url):
     create_database(engine.url) 
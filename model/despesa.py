@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, CheckConstraint, Index
 from datetime import datetime
 import enum
 
@@ -11,39 +11,37 @@ class TipoDespesa(enum.Enum):
     BOLETO = "BOLETO"
 
 class Despesa(Base):
+    """
+    Despesa mensal. Criada pelo construtor padrão do SQLAlchemy, com as colunas
+    como argumentos nomeados.
+
+    Arguments:
+        tipo: tipo da despesa (CRÉDITO FIXO, CRÉDITO PARCELADO, PIX, BOLETO)
+        titulo: título da despesa
+        valor: valor da despesa
+        dia_vencimento: dia do mês (1-31) de vencimento do pagamento
+        parcelas: quantidade de parcelas (apenas para CRÉDITO PARCELADO)
+        paga: se a despesa foi paga ou não (padrão: False)
+        data_insercao: data de inserção da despesa (padrão: agora)
+    """
     __tablename__ = 'despesa'
 
     id = Column(Integer, primary_key=True)
-    tipo = Column(Enum(TipoDespesa), nullable=False)
+    tipo = Column(String(32), nullable=False)  # Valor de TipoDespesa, gravado como texto
     titulo = Column(String(100), nullable=False)
     valor = Column(Float, nullable=False)
     dia_vencimento = Column(Integer, nullable=False)  # Dia do mês (1-31)
     parcelas = Column(Integer, nullable=True)
     paga = Column(Boolean, default=False)
     data_insercao = Column(DateTime, default=datetime.utcnow)
+    data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Usada no ETag
 
-    def __repr__(self):
-        return f"<Despesa(id={self.id}, tipo='{self.tipo.value}', titulo='{self.titulo}', valor={self.valor}, dia_vencimento={self.dia_vencimento}, parcelas={self.parcelas}, paga={self.paga})>"
-
-    def __init__(self, tipo: TipoDespesa, titulo: str, valor: float, 
-                 dia_vencimento: int, parcelas: int = None, paga: bool = False, data_insercao: datetime = None):
-        """
-        Cria uma Despesa
+    __table_args__ = (
+        CheckConstraint("tipo IN (%s)" % ", ".join("'%s'" % t.value for t in TipoDespesa),
+                        name="ck_despesa_tipo"),
+        # Listagem ordenada das mais recentes para as mais antigas
+        Index("ix_despesa_data_insercao", data_insercao.desc(), id.desc()),
+    )
 
-        Arguments:
-            tipo: tipo da despesa (CRÉDITO FIXO, CRÉDITO PARCELADO, PIX, BOLETO)
-            titulo: título da despesa
-            valor: valor da despesa
-            dia_vencimento: dia do mês (1-31) de vencimento do pagamento
-            parcelas: quantidade de parcelas (apenas para CRÉDITO PARCELADO)
-            paga: se a despesa foi paga ou não
-            data_insercao: data de inserção da despesa
-        """
-        self.tipo = tipo
-        self.titulo = titulo
-        self.valor = valor
-        self.dia_vencimento = dia_vencimento
-        self.parcelas = parcelas
-        self.paga = paga
-        if data_insercao:
-            self.data_insercao = data_insercao 
\ No newline at end of file
+    def __repr__(self):
+        return f"<Despesa(id={self.id}, tipo='{self.tipo}', titulo='{self.titulo}', valor={self.valor}, dia_vencimento={self.dia_vencimento}, parcelas={self.parcelas}, paga={self.paga})>"
@@ -1,7 +1,22 @@
 from pydantic import BaseModel, validator, Field
-from typing import Optional, List, Union
+from typing import Optional, List, Literal
 from datetime import datetime
-from model.despesa import Despesa, TipoDespesa
+from model.despesa import Despesa
+
+
+# Formato brasileiro usado nas datas das respostas
+FORMATO_DATA = "%d/%m/%Y %H:%M"
+
+# Valores aceitos para o tipo, validados diretamente pelo pydantic
+TipoLiteral = Literal["CRÉDITO FIXO", "CRÉDITO PARCELADO", "PIX", "BOLETO"]
+
+
+def parcelas_vazias_como_none(v):
+    """ O FormData envia parcelas não informadas como "" ou "null".
+    """
+    if v is None or v == "null" or v == "":
+        return None
+    return v
 
 
 class DespesaSchema(BaseModel):
@@ -13,46 +28,21 @@ class DespesaSchema(BaseModel):
     - dia_vencimento: Deve estar entre 1 e 31
     - parcelas: Deve ser positivo (apenas para CRÉDITO PARCELADO)
     """
-    tipo: str = Field(..., example="CRÉDITO FIXO", description="Tipo da despesa")
+    tipo: TipoLiteral = Field(..., example="CRÉDITO FIXO", description="Tipo da despesa")
     titulo: str = Field(..., example="Cartão de Crédito Nubank", description="Título da despesa")
-    valor: float = Field(..., example=1500.75, description="Valor da despesa")
-    dia_vencimento: int = Field(..., example=15, description="Dia do mês de vencimento (1-31)")
-    parcelas: Optional[int] = Field(None, example=12, description="Quantidade de parcelas restantes (apenas para CRÉDITO PARCELADO)")
+    valor: float = Field(..., gt=0, example=1500.75, description="Valor da despesa")
+    dia_vencimento: int = Field(..., ge=1, le=31, example=15, description="Dia do mês de vencimento (1-31)")
+    parcelas: Optional[int] = Field(None, gt=0, example=12, description="Quantidade de parcelas restantes (apenas para CRÉDITO PARCELADO)")
     paga: bool = Field(False, example=False, description="Se a despesa foi paga")
 
-    @validator('tipo')
-    def validate_tipo(cls, v):
-        tipos_validos = ["CRÉDITO FIXO", "CRÉDITO PARCELADO", "PIX", "BOLETO"]
-        if v not in tipos_validos:
-            raise ValueError(f'Tipo deve ser um dos seguintes: {tipos_validos}')
-        return v
-
-    @validator('parcelas', pre=True)
-    def validate_parcelas(cls, v):
-        if v is None or v == "null" or v == "":
-            return None
-        if isinstance(v, str):
-            try:
-                return int(v)
-            except ValueError:
-                raise ValueError('Parcelas deve ser um número inteiro')
-        if isinstance(v, int):
-            if v <= 0:
-                raise ValueError('Parcelas deve ser um número positivo')
-            return v
-        return v
-
-    @validator('valor')
-    def validate_valor(cls, v):
-        if v <= 0:
-            raise ValueError('Valor deve ser maior que zero')
-        return v
-
-    @validator('dia_vencimento')
-    def validate_dia_vencimento(cls, v):
-        if v < 1 or v > 31:
-            raise ValueError('Dia de vencimento deve ser entre 1 e 31')
-        return v
+    _parcelas_vazias = validator('parcelas', pre=True, allow_reuse=True)(parcelas_vazias_como_none)
+
+
+class DespesaBulkSchema(BaseModel):
+    """ Define como um lote de novas despesas a serem inseridas deve ser
+        representado. Cada item segue as validações de DespesaSchema.
+    """
+    items: List[DespesaSchema] = Field(..., min_items=1, description="Despesas a serem inseridas")
 
 
 class DespesaBuscaSchema(BaseModel):
@@ -76,47 +66,14 @@ class DespesaAtualizaSchema(BaseModel):
     - Pelo menos um campo opcional deve ser fornecido para atualização
     """
     id: int = Field(..., example=1, description="ID da despesa")
-    tipo: Optional[str] = Field(None, example="CRÉDITO PARCELADO", description="Tipo da despesa")
+    tipo: Optional[TipoLiteral] = Field(None, example="CRÉDITO PARCELADO", description="Tipo da despesa")
     titulo: Optional[str] = Field(None, example="Cartão de Crédito Itaú", description="Título da despesa")
-    valor: Optional[float] = Field(None, example=2000.50, description="Valor da despesa")
-    dia_vencimento: Optional[int] = Field(None, example=20, description="Dia do mês de vencimento (1-31)")
-    parcelas: Optional[int] = Field(None, example=6, description="Quantidade de parcelas restantes")
+    valor: Optional[float] = Field(None, gt=0, example=2000.50, description="Valor da despesa")
+    dia_vencimento: Optional[int] = Field(None, ge=1, le=31, example=20, description="Dia do mês de vencimento (1-31)")
+    parcelas: Optional[int] = Field(None, gt=0, example=6, description="Quantidade de parcelas restantes")
     paga: Optional[bool] = Field(None, example=True, description="Se a despesa foi paga")
 
-    @validator('tipo')
-    def validate_tipo(cls, v):
-        if v is not None:
-            tipos_validos = ["CRÉDITO FIXO", "CRÉDITO PARCELADO", "PIX", "BOLETO"]
-            if v not in tipos_validos:
-                raise ValueError(f'Tipo deve ser um dos seguintes: {tipos_validos}')
-        return v
-
-    @validator('parcelas', pre=True)
-    def validate_parcelas(cls, v):
-        if v is None or v == "null" or v == "":
-            return None
-        if isinstance(v, str):
-            try:
-                return int(v)
-            except ValueError:
-                raise ValueError('Parcelas deve ser um número inteiro')
-        if isinstance(v, int):
-            if v <= 0:
-                raise ValueError('Parcelas deve ser um número positivo')
-            return v
-        return v
-
-    @validator('valor')
-    def validate_valor(cls, v):
-        if v is not None and v <= 0:
-            raise ValueError('Valor deve ser maior que zero')
-        return v
-
-    @validator('dia_vencimento')
-    def validate_dia_vencimento(cls, v):
-        if v is not None and (v < 1 or v > 31):
-            raise ValueError('Dia de vencimento deve ser entre 1 e 31')
-        return v
+    _parcelas_vazias = validator('parcelas', pre=True, allow_reuse=True)(parcelas_vazias_como_none)
 
 
 class ListagemDespesasSchema(BaseModel):
@@ -148,19 +105,19 @@ class ListagemDespesasSchema(BaseModel):
 
 def apresenta_despesas(despesas: List[Despesa]):
     """ Retorna uma representação das despesas seguindo o schema definido.
+        Aceita também linhas de um SELECT/RETURNING com as mesmas colunas.
     """
-    result = []
-    for despesa in despesas:
-        result.append({
-            "id": despesa.id,
-            "tipo": despesa.tipo.value,
-            "titulo": despesa.titulo,
-            "valor": despesa.valor,
-            "parcelas": despesa.parcelas,
-            "dia_vencimento": despesa.dia_vencimento,
-            "paga": despesa.paga,
-            "data_insercao": despesa.data_insercao.strftime("%d/%m/%Y %H:%M")
-        })
+    formata = datetime.strftime
+    result = [{
+        "id": despesa.id,
+        "tipo": despesa.tipo,
+        "titulo": despesa.titulo,
+        "valor": despesa.valor,
+        "parcelas": despesa.parcelas,
+        "dia_vencimento": despesa.dia_vencimento,
+        "paga": despesa.paga,
+        "data_insercao": formata(despesa.data_insercao, FORMATO_DATA)
+    } for despesa in despesas]
 
     return {"despesas": result}
 
@@ -188,15 +145,16 @@ class DespesaDelSchema(BaseModel):
 
 def apresenta_despesa(despesa: Despesa):
     """ Retorna uma representação da despesa seguindo o schema definido em
-        DespesaViewSchema.
+        DespesaViewSchema. Aceita também linhas de um SELECT/RETURNING com as
+        mesmas colunas.
     """
     return {
         "id": despesa.id,
-        "tipo": despesa.tipo.value,
+        "tipo": despesa.tipo,
         "titulo": despesa.titulo,
         "valor": despesa.valor,
         "parcelas": despesa.parcelas,
         "dia_vencimento": despesa.dia_vencimento,
         "paga": despesa.paga,
-        "data_insercao": despesa.data_insercao.strftime("%d/%m/%Y %H:%M")
+        "data_insercao": despesa.data_insercao.strftime(FORMATO_DATA)
     } 
\ No newline at end of file